@@ -1,18 +1,26 @@
+import itertools
+import mmap
+import multiprocessing
 import os
+import queue
 import re
 import shutil
 import sys
+import tempfile
 import threading
+from concurrent.futures import ProcessPoolExecutor
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 
-CODE_EXTENSIONS = ['.gml', '.yy', '.yyp']
-SPRITE_VARS = [
-    r'sprite_index',
-    r'\w*spr\w*',
-]
+CODE_EXTENSIONS = ('.gml', '.yy', '.yyp')
 LOG_FILENAME = "spritereplacement_log.txt"
 ICON_FILE = "icon.ico"
+LOG_DRAIN_MS = 50
+LOG_BATCH_SIZE = 500
+POOL_MIN_FILES = 64
+# Rest of an assignment after the "spr" in its variable name: the remaining
+# identifier characters, then `= <number>;` with whitespace kept on one line.
+_TAIL_RE = re.compile(r'(\w*)[^\S\n]*=[^\S\n]*(\d+)[^\S\n]*;')
 
 def load_sprite_map(mapping_file):
     mapping = {}
@@ -26,69 +34,196 @@ def load_sprite_map(mapping_file):
             key, value = line.split('-', 1)
             key = key.strip()
             value = value.strip()
-            mapping[key] = value
+            if not key.isdecimal():
+                continue
+            try:
+                mapping[int(key)] = value
+            except ValueError:
+                continue
     return mapping
 
-def backup_file(filepath):
-    if not os.path.exists(filepath + '.bak'):
-        shutil.copy(filepath, filepath + '.bak')
+def _index_table(mapping):
+    if mapping and max(mapping) < 4 * len(mapping):
+        table = [None] * (max(mapping) + 1)
+        for key, value in mapping.items():
+            table[key] = value
+        return table
+    return mapping
 
-def replace_in_file(filename, sprite_map, gui_log_callback=None, file_log_callback=None):
-    changed = False
+def write_with_backup(filepath, data):
+    filepath = os.path.realpath(filepath)
+    backup_path = filepath + '.bak'
+    if not os.path.exists(backup_path):
+        try:
+            os.link(filepath, backup_path)
+        except OSError:
+            shutil.copy2(filepath, backup_path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        shutil.copymode(filepath, tmp_path)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _scan_and_replace(text, sprite_map):
+    hits = []
+    if 'spr' not in text:
+        return text, hits
+    out = []
+    find = text.find
+    tail_match = _TAIL_RE.match
+    is_table = isinstance(sprite_map, list)
+    if is_table:
+        size = len(sprite_map)
+    else:
+        get = sprite_map.get
+    last = 0
+    i = 0
+    while True:
+        pos = find('spr', i)
+        if pos == -1:
+            break
+        start = pos
+        while start > i:
+            c = text[start - 1]
+            if not (c.isalnum() or c == '_'):
+                break
+            start -= 1
+        m = tail_match(text, pos + 3)
+        if m is None:
+            i = pos + 3
+            continue
+        end = m.end(1)
+        num = m.group(2)
+        i = m.end()
+        try:
+            key = int(num)
+        except ValueError:
+            continue
+        if is_table:
+            mapped = sprite_map[key] if key < size else None
+        else:
+            mapped = get(key)
+        if mapped is not None:
+            new_line = f"{text[start:end]} = {mapped};"
+            out.append(text[last:start])
+            out.append(new_line)
+            last = i
+            hits.append((start, i, new_line))
+    if not hits:
+        return text, hits
+    out.append(text[last:])
+    return ''.join(out), hits
+
+def find_replacements(filename, sprite_map):
     replacements = []
-    with open(filename, encoding='utf-8') as f:
-        lines = f.readlines()
-    new_lines = []
-    for idx, line in enumerate(lines, 1):
-        orig_line = line
-        for var in SPRITE_VARS:
-            pattern = r'(' + var + r')\s*=\s*(\d+)\s*;'
-            def repl(match):
-                varname = match.group(1)
-                num = match.group(2)
-                if num in sprite_map:
-                    new_line = f"{varname} = {sprite_map[num]};"
-                    msg = f"[{os.path.basename(filename)}:{idx}] {orig_line.strip()} → {new_line}"
-                    if gui_log_callback:
-                        gui_log_callback(msg)
-                    if file_log_callback:
-                        file_log_callback(msg)
-                    replacements.append((orig_line, new_line, idx))
-                    return new_line
-                else:
-                    return match.group(0)
-            line = re.sub(pattern, repl, line)
-        if line != orig_line:
-            changed = True
-        new_lines.append(line)
+    with open(filename, 'rb') as f:
+        # mmap refuses empty files, and there is nothing to replace in them anyway.
+        if os.fstat(f.fileno()).st_size == 0:
+            return filename, False, None, replacements
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b'spr') == -1:
+                return filename, False, None, replacements
+            data = mm[:].decode('utf-8')
+    new_data, hits = _scan_and_replace(data, sprite_map)
+    if not hits:
+        return filename, False, None, replacements
+    for start, end, new_line in hits:
+        idx = data.count('\n', 0, start) + 1
+        line_start = data.rfind('\n', 0, start) + 1
+        line_end = data.find('\n', end)
+        if line_end == -1:
+            orig_line = data[line_start:]
+        else:
+            orig_line = data[line_start:line_end].rstrip('\r') + '\n'
+        replacements.append((orig_line, new_line, idx))
+    return filename, True, new_data.encode('utf-8'), replacements
+
+def apply_replacements(result, gui_log_callback=None, file_log_callback=None):
+    filename, changed, new_data, replacements = result
+    if replacements:
+        basename = os.path.basename(filename)
+        msg = "\n".join(
+            f"[{basename}:{idx}] {orig_line.strip()} → {new_line}"
+            for orig_line, new_line, idx in replacements
+        )
+        if gui_log_callback:
+            gui_log_callback(msg)
+        if file_log_callback:
+            file_log_callback(msg)
     if changed:
-        backup_file(filename)
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
+        write_with_backup(filename, new_data)
     return changed, replacements
 
+def replace_in_file(filename, sprite_map, gui_log_callback=None, file_log_callback=None):
+    return apply_replacements(
+        find_replacements(filename, sprite_map), gui_log_callback, file_log_callback
+    )
+
+_worker_sprite_map = None
+
+def _init_worker(sprite_map):
+    global _worker_sprite_map
+    _worker_sprite_map = sprite_map
+
+def _scan_worker(filepath):
+    return find_replacements(filepath, _worker_sprite_map)
+
+def _iter_files(top):
+    try:
+        it = os.scandir(top)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_files(entry.path)
+            elif entry.name.endswith(CODE_EXTENSIONS) and entry.is_file():
+                yield entry.path
+
 def scan_and_replace(project_dir, mapping_file, gui_log_callback=None, status_callback=None):
-    sprite_map = load_sprite_map(mapping_file)
+    sprite_map = _index_table(load_sprite_map(mapping_file))
     replaced_files = []
     all_replacements = []
     log_path = os.path.join(os.path.dirname(sys.argv[0]), LOG_FILENAME)
+    paths = list(_iter_files(project_dir))
     with open(log_path, "w", encoding="utf-8") as log_f:
+        write_log = log_f.write
         def file_log_callback(msg):
-            log_f.write(msg + "\n")
-        for root, dirs, files in os.walk(project_dir):
-            for file in files:
-                if any(file.endswith(ext) for ext in CODE_EXTENSIONS):
-                    filepath = os.path.join(root, file)
-                    if status_callback:
-                        status_callback(f"Scanning: {filepath}")
-                    if gui_log_callback:
-                        gui_log_callback(f"Checking: {filepath}")
-                    changed, replacements = replace_in_file(
-                        filepath, sprite_map, gui_log_callback, file_log_callback
-                    )
-                    if changed:
-                        replaced_files.append(filepath)
-                        all_replacements.extend([(filepath, *rep) for rep in replacements])
+            write_log(msg + "\n")
+        append_file = replaced_files.append
+        extend_reps = all_replacements.extend
+        if status_callback:
+            status_callback(f"Scanning {len(paths)} files...")
+        ex = None
+        try:
+            if len(paths) >= POOL_MIN_FILES:
+                ex = ProcessPoolExecutor(
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker, initargs=(sprite_map,)
+                )
+                results = ex.map(_scan_worker, paths, chunksize=16)
+            else:
+                results = map(find_replacements, paths, itertools.repeat(sprite_map))
+            for result in results:
+                filepath = result[0]
+                if gui_log_callback:
+                    gui_log_callback(f"Checked: {filepath}")
+                changed, replacements = apply_replacements(
+                    result, gui_log_callback, file_log_callback
+                )
+                if changed:
+                    append_file(filepath)
+                    extend_reps([(filepath, *rep) for rep in replacements])
+        finally:
+            if ex is not None:
+                ex.shutdown(cancel_futures=True)
         summary = f"\nReplacements done in {len(replaced_files)} files.\nLog saved to {log_path}\n"
         if gui_log_callback:
             gui_log_callback(summary)
@@ -143,14 +278,19 @@ class SpriteReplacerGUI:
         mapping_entry.grid(row=1, column=1, sticky="ew")
         browse_mapping_btn = ttk.Button(mainframe, text="Browse", command=self.browse_mapping)
         browse_mapping_btn.grid(row=1, column=2, padx=(8,0), ipadx=8, ipady=2, sticky="ew")
-        run_btn = ttk.Button(mainframe, text="Run Replacement", command=self.run_replacement_thread, style="Accent.TButton")
-        run_btn.grid(row=2, column=0, columnspan=3, pady=12, sticky="ew")
+        self.run_btn = ttk.Button(mainframe, text="Run Replacement", command=self.run_replacement_thread, style="Accent.TButton")
+        self.run_btn.grid(row=2, column=0, columnspan=3, pady=12, sticky="ew")
         self.status = ttk.Label(mainframe, text="Status: Ready")
         self.status.grid(row=3, column=0, columnspan=3, sticky="w", pady=(0,5))
         self.output = scrolledtext.ScrolledText(mainframe, width=80, height=20, state='disabled', bg=text_bg, fg=fg, insertbackground=fg)
         self.output.grid(row=4, column=0, columnspan=3, padx=5, pady=5, sticky="nsew")
         mainframe.columnconfigure(1, weight=1)
         mainframe.rowconfigure(4, weight=1)
+        self._log_queue = queue.Queue()
+        self._status_text = self._shown_status = "Ready"
+        self._worker = None
+        self._worker_error = None
+        self.root.after(LOG_DRAIN_MS, self._drain_logs)
 
     def browse_project(self):
         directory = filedialog.askdirectory()
@@ -161,42 +301,66 @@ class SpriteReplacerGUI:
         if file:
             self.mapping_file.set(file)
     def log(self, msg):
-        self.output.config(state='normal')
-        self.output.insert(tk.END, msg + "\n")
-        self.output.see(tk.END)
-        self.output.config(state='disabled')
-        self.root.update_idletasks()
+        self._log_queue.put(msg)
     def set_status(self, msg):
-        self.status.config(text=f"Status: {msg}")
-        self.root.update_idletasks()
+        self._status_text = msg
+    def _drain_logs(self):
+        batch = []
+        try:
+            while len(batch) < LOG_BATCH_SIZE:
+                batch.append(self._log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            self.output.config(state='normal')
+            self.output.insert(tk.END, "\n".join(batch) + "\n")
+            self.output.see(tk.END)
+            self.output.config(state='disabled')
+        status = self._status_text
+        status_changed = status != self._shown_status
+        if status_changed:
+            self._shown_status = status
+            self.status.config(text=f"Status: {status}")
+        if batch or status_changed:
+            self.root.update_idletasks()
+        if self._worker is not None and not self._worker.is_alive() and self._log_queue.empty():
+            self._finish_replacement()
+        self.root.after(LOG_DRAIN_MS, self._drain_logs)
     def run_replacement_thread(self):
-        self.output.config(state='normal')
-        self.output.delete(1.0, tk.END)
-        self.output.config(state='disabled')
-        self.set_status("Working...")
-        thread = threading.Thread(target=self.run_replacement, daemon=True)
-        thread.start()
-    def run_replacement(self):
         project_dir = self.project_dir.get()
         mapping_file = self.mapping_file.get()
         if not os.path.isdir(project_dir):
-            self.set_status("Ready")
             messagebox.showerror("Error", "Please select a valid GameMaker project folder.")
             return
         if not os.path.isfile(mapping_file):
-            self.set_status("Ready")
             messagebox.showerror("Error", "Please select a valid mapping file.")
             return
+        self.run_btn.config(state='disabled')
+        self.output.config(state='normal')
+        self.output.delete(1.0, tk.END)
+        self.output.config(state='disabled')
+        self.set_status("Working...")
+        self._worker_error = None
+        self._worker = threading.Thread(
+            target=self.run_replacement, args=(project_dir, mapping_file), daemon=True
+        )
+        self._worker.start()
+    def run_replacement(self, project_dir, mapping_file):
         try:
             scan_and_replace(
                 project_dir, mapping_file, gui_log_callback=self.log, status_callback=self.set_status
             )
         except Exception as e:
-            self.set_status("Ready")
-            messagebox.showerror("Error", f"An error occurred:\n{e}")
+            self._worker_error = e
         self.set_status("Ready")
+    def _finish_replacement(self):
+        self._worker = None
+        self.run_btn.config(state='normal')
+        if self._worker_error is not None:
+            messagebox.showerror("Error", f"An error occurred:\n{self._worker_error}")
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     root = tk.Tk()
     gui = SpriteReplacerGUI(root)
     root.mainloop()
\ No newline at end of file